@@ -22,23 +22,44 @@
 
 
 import argparse
+import concurrent.futures
+import contextlib
 import enum
 import hashlib
+import io
+import itertools
 import json
 import os
+import pickle
 import re
-import shutil
 import tempfile
+import time
+import urllib.error
 import urllib.parse
 import urllib.request
-from collections.abc import Collection
-from glob import glob
+from collections.abc import Collection, Iterable
 
 import attrs
 import bibtexparser
 import cattrs
 import yaml
 
+try:
+    # BibtexParser 2 has a much faster parser, but it no longer has the helper
+    # modules of BibtexParser 1. The latter is still supported as a fallback.
+    # Only its basic parser and model are used, which also exist in its pre-releases.
+    import bibtexparser.model
+except ImportError:
+    BIBTEXPARSER2 = False
+else:
+    BIBTEXPARSER2 = True
+
+try:
+    # orjson is optional, and only used to load JSON files faster.
+    import orjson
+except ImportError:
+    orjson = None
+
 
 @enum.unique
 class DuplicatePolicy(enum.Enum):
@@ -108,19 +129,74 @@ IGNORED_CITATIONS = set(
     ]
 )
 
+# Settings for downloading journal abbreviations.
+# The maximum number of concurrent downloads is shared by all processes.
+DOWNLOAD_MAX_WORKERS = 16
+DOWNLOAD_TIMEOUT = 30
+DOWNLOAD_ATTEMPTS = 3
+# Delay in seconds before the first retry, doubled for every next one.
+DOWNLOAD_BACKOFF = 1.0
+
 
 def main() -> int:
     """Bibsane main program."""
     fns_aux, verbose, config = parse_args()
     if len(fns_aux) == 0:
-        # Only select aux files for which corresponding tex files exist.
-        fns_aux = [
-            fn for fn in glob("**/*.aux", recursive=True) if os.path.isfile(fn[:-4] + ".tex")
-        ]
-    for ifn, fn_aux in enumerate(fns_aux):
-        if ifn > 0:
+        fns_aux = find_aux_files()
+    if len(fns_aux) <= 1:
+        # Without parallelism, there is no need to buffer the output.
+        retcodes = [process_aux(fn_aux, verbose, config) for fn_aux in fns_aux]
+        return max(retcodes, default=RETURN_CODE_UNCHANGED)
+    # Process multiple aux files in parallel and print their output in order.
+    max_workers = min(len(fns_aux), os.cpu_count() or 1)
+    # Share the concurrent downloads of journal abbreviations among the processes.
+    download_workers = max(DOWNLOAD_MAX_WORKERS // max_workers, 1)
+    with concurrent.futures.ProcessPoolExecutor(max_workers) as executor:
+        results = executor.map(
+            process_aux_buffered,
+            fns_aux,
+            itertools.repeat(verbose),
+            itertools.repeat(config),
+            itertools.repeat(download_workers),
+        )
+        return print_results(results)
+
+
+def print_results(results: Iterable[tuple[int, str]]) -> int:
+    """Print the output of each aux file and return the most severe return code."""
+    retcode = RETURN_CODE_UNCHANGED
+    for iresult, (aux_retcode, output) in enumerate(results):
+        if iresult > 0:
             print()
-        return process_aux(fn_aux, verbose, config)
+        print(output, end="")
+        retcode = max(retcode, aux_retcode)
+    return retcode
+
+
+# Directories that never contain LaTeX documents, which are skipped when searching aux files.
+# Hidden directories and files are skipped as well.
+SKIPPED_DIRECTORIES = frozenset(["node_modules", "__pycache__", "venv"])
+
+
+def find_aux_files(root: str = ".") -> list[str]:
+    """Find aux files recursively, for which the corresponding tex files exist."""
+    fns_aux = []
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames[:] = [
+            dirname
+            for dirname in dirnames
+            if not dirname.startswith(".") and dirname not in SKIPPED_DIRECTORIES
+        ]
+        # Check the tex files in the directory listing instead of calling stat for each one.
+        filenames = set(filenames)
+        fns_aux.extend(
+            os.path.normpath(os.path.join(dirpath, filename))
+            for filename in filenames
+            if not filename.startswith(".")
+            and filename.endswith(".aux")
+            and filename[:-4] + ".tex" in filenames
+        )
+    return sorted(fns_aux)
 
 
 def parse_args() -> tuple[list[str], bool, Config]:
@@ -134,7 +210,24 @@ def parse_args() -> tuple[list[str], bool, Config]:
     return args.aux, not args.quiet, config
 
 
-def process_aux(fn_aux: str, verbose: bool, config: Config) -> int:
+def process_aux_buffered(
+    fn_aux: str, verbose: bool, config: Config, download_workers: int
+) -> tuple[int, str]:
+    """Process an aux file and return the return code and the buffered output."""
+    f = io.StringIO()
+    try:
+        with contextlib.redirect_stdout(f):
+            retcode = process_aux(fn_aux, verbose, config, download_workers)
+    except BaseException:
+        # Do not lose the output that explains what happened before the error.
+        print(f.getvalue(), end="", flush=True)
+        raise
+    return retcode, f.getvalue()
+
+
+def process_aux(
+    fn_aux: str, verbose: bool, config: Config, download_workers: int = DOWNLOAD_MAX_WORKERS
+) -> int:
     """Main program."""
     # Load the aux file.
     if not fn_aux.endswith(".aux"):
@@ -162,15 +255,17 @@ def process_aux(fn_aux: str, verbose: bool, config: Config) -> int:
     # Collect entries
     if verbose:
         print("📂 Loading", " ".join(fns_bib))
-    entries, valid_duplicates = collect_entries(fns_bib, config)
+    entries, defined, valid_duplicates = collect_entries(fns_bib, citations, config)
     if verbose:
-        print(f"   Found {len(entries)} BibTeX entries")
+        print(f"   Found {len(entries)} cited BibTeX entries")
     retcode = RETURN_CODE_CHANGED if valid_duplicates else RETURN_CODE_BROKEN
 
     # Drop unused and check for missing
     if verbose:
         print("🔨 Checking unused and missing citations")
-    entries, bibdata_complete = drop_check_citations(entries, citations, config.drop_entry_types)
+    entries, bibdata_complete = drop_check_citations(
+        entries, citations, defined, config.drop_entry_types
+    )
     if not bibdata_complete:
         retcode = RETURN_CODE_BROKEN
     if verbose:
@@ -226,7 +321,7 @@ def process_aux(fn_aux: str, verbose: bool, config: Config) -> int:
         if verbose:
             print("🔨 Abbreviating journal names")
         fn_cache = os.path.join(config.root, config.abbreviate_journal)
-        entries = abbreviate_journal_iso(entries, fn_cache)
+        entries = abbreviate_journal_iso(entries, fn_cache, download_workers)
 
     # Merge entries
     if config.duplicate_id == DuplicatePolicy.MERGE:
@@ -258,15 +353,21 @@ def process_aux(fn_aux: str, verbose: bool, config: Config) -> int:
     return write_output(entries, fn_out, retcode, verbose)
 
 
+# Lines in a LaTeX aux file with citations or BibTeX files.
+AUX_PATTERN = re.compile(r"^\\(citation|bibdata)\{([^{}\n]*)\}$", re.MULTILINE)
+
+
 def parse_aux(fn_aux: str) -> tuple[list[str], list[str]]:
     """Parse the relevant parts of a LaTeX aux file."""
     root = os.path.dirname(fn_aux)
     citations = []
     bibdata = []
+    words = {"citation": citations, "bibdata": bibdata}
+    # Citations may appear anywhere in the aux file, so it cannot be read partially.
+    # Instead, the relevant lines are found with a single scan over the whole file.
     with open(fn_aux) as f:
-        for line in f:
-            parse_aux_line("citation", line, citations)
-            parse_aux_line("bibdata", line, bibdata)
+        for match in AUX_PATTERN.finditer(f.read()):
+            words[match.group(1)].extend(match.group(2).split(","))
     fns_bib = []
     for fn_bib in bibdata:
         if not fn_bib.endswith(".bib"):
@@ -277,52 +378,308 @@ def parse_aux(fn_aux: str) -> tuple[list[str], list[str]]:
     return citations, fns_bib
 
 
-def parse_aux_line(prefix: str, line: str, words: list[str]):
-    """Parse a (simple) line from a LaTeX aux file."""
-    if line.startswith(rf"\{prefix}{{"):
-        assert line.endswith("}\n")
-        assert line.count("{") == 1
-        assert line.count("}") == 1
-        words.extend(line[line.find("{") + 1 : -2].split(","))
-
+def collect_entries(
+    fns_bib: list[str], citations: Collection[str], config: Config
+) -> tuple[list[dict[str, str]], set[str], bool]:
+    """Collect the cited entries from multiple BibTeX files.
 
-def collect_entries(fns_bib: list[str], config: Config) -> tuple[list[dict[str, str]], bool]:
-    """Collect entries from multiple BibTeX files."""
+    The set of BibTeX IDs is returned as well, to avoid recomputing it later.
+    """
     # Collect stuff
     seen_ids = set()
     seen_dois = set()
     entries = []
     valid = True
+    fail_id = config.duplicate_id == DuplicatePolicy.FAIL
+    fail_doi = config.duplicate_doi == DuplicatePolicy.FAIL
+    append = entries.append
     for fn_bib in fns_bib:
-        bibtex_parser = bibtexparser.bparser.BibTexParser(
-            homogenize_fields=True,
-            ignore_nonstandard_types=False,
-        )
-        with open(fn_bib) as f:
-            db_in = bibtexparser.load(f, bibtex_parser)
-        if len(db_in.preambles) > 0 and not config.preambles_allowed:
+        bib_entries, has_preambles = load_bib(fn_bib, citations)
+        if has_preambles and not config.preambles_allowed:
             print("   🤖 @preamble is not allowed")
             valid = False
-        for entry in db_in.entries:
-            if entry["ID"] in seen_ids and config.duplicate_id == DuplicatePolicy.FAIL:
-                print(f"  ‼️ Duplicate BibTeX entry: {entry['ID']}")
+        for entry in bib_entries:
+            eid = entry["ID"]
+            if fail_id and eid in seen_ids:
+                print(f"  ‼️ Duplicate BibTeX entry: {eid}")
                 valid = False
-            if "doi" in entry:
-                if entry["doi"] in seen_dois and config.duplicate_doi == DuplicatePolicy.FAIL:
-                    print(f"‼  ️ Duplicate DOI: {entry['doi']}")
+            doi = entry.get("doi")
+            if doi is not None:
+                if fail_doi and doi in seen_dois:
+                    print(f"‼  ️ Duplicate DOI: {doi}")
                     valid = False
-                seen_dois.add(entry["doi"])
-            entries.append(entry)
-            seen_ids.add(entry["ID"])
-    return entries, valid
+                seen_dois.add(doi)
+            append(entry)
+            seen_ids.add(eid)
+    return entries, seen_ids, valid
+
+
+# Alternative field names, which are homogenized when loading BibTeX files.
+# These are the same as in BibtexParser 1 with homogenize_fields=True.
+FIELD_ALIASES = {
+    "keyw": "keyword",
+    "keywords": "keyword",
+    "authors": "author",
+    "editors": "editor",
+    "urls": "url",
+    "link": "url",
+    "links": "url",
+    "subjects": "subject",
+    "xref": "crossref",
+}
+
+
+# Start of a block in a BibTeX file: the block type, the opening delimiter and the key (if any).
+BIB_BLOCK_PATTERN = re.compile(r"@[ \t]*(\w+)[ \t]*([{(])\s*([^,\s]*)")
+
+# Braces inside a block, and the closing parenthesis of a block delimited by parentheses.
+BIB_DELIMITER_PATTERN = re.compile(r"[{})]")
+
+# Increase when the format of the cached entries changes.
+BIB_CACHE_VERSION = 5
+
+
+def split_bib_blocks(bibtex: str) -> list[tuple[str, str, str]]:
+    """Split a BibTeX string into blocks without parsing them.
+
+    Blocks are located with a cheap regular expression. After each block header,
+    the scan resumes at the end of the block, such that matches inside it are ignored.
+    The result is a list of tuples with the (lowercase) block type, the key and the text.
+    """
+    matches = []
+    pos = 0
+    while True:
+        match = BIB_BLOCK_PATTERN.search(bibtex, pos)
+        if match is None:
+            break
+        matches.append(match)
+        pos = find_bib_block_end(bibtex, match)
+    blocks = []
+    for imatch, match in enumerate(matches):
+        end = matches[imatch + 1].start() if imatch + 1 < len(matches) else len(bibtex)
+        blocks.append((match.group(1).lower(), match.group(3), bibtex[match.start() : end]))
+    return blocks
+
+
+def find_bib_block_end(bibtex: str, match: re.Match) -> int:
+    """Return the position after the closing delimiter of a block.
+
+    Comments and unterminated blocks end right after their header,
+    because their braces need not be balanced.
+    """
+    if match.group(1).lower() == "comment":
+        return match.end()
+    opening = match.group(2)
+    depth = 1 if opening == "{" else 0
+    for delimiter in BIB_DELIMITER_PATTERN.finditer(bibtex, match.end(2)):
+        char = delimiter.group()
+        if char == "{":
+            depth += 1
+        elif char == "}":
+            depth -= 1
+            if depth == 0 and opening == "{":
+                return delimiter.end()
+            if depth < 0:
+                break
+        elif depth == 0:
+            return delimiter.end()
+    return match.end()
+
+
+def load_bib(fn_bib: str, citations: Collection[str]) -> tuple[list[dict[str, str]], bool]:
+    """Load the cited entries from a BibTeX file and check for the presence of preambles.
+
+    Only the cited entries are parsed, which avoids parsing the (many) unused entries
+    in a large BibTeX file. Parsed entries are cached, such that they need to be parsed
+    only once, as long as the BibTeX file does not change.
+    """
+    fn_cache = bib_cache_path(fn_bib)
+    stat = os.stat(fn_bib)
+    stamp = (BIB_CACHE_VERSION, BIBTEXPARSER2, stat.st_mtime_ns, stat.st_size)
+    cache = load_bib_cache(fn_cache, stamp)
+    blocks = None
+    if cache is None:
+        with open(fn_bib) as f:
+            blocks = split_bib_blocks(f.read())
+        cache = {
+            "stamp": stamp,
+            "preambles": any(block_type == "preamble" for block_type, _, _ in blocks),
+            # Keys of all entries, in the order of the file.
+            "keys": list(
+                dict.fromkeys(key for block_type, key, _ in blocks if block_type != "comment")
+            ),
+            # Parsed entries (values) of each loaded key.
+            "entries": {},
+        }
+
+    # Parse missing entries.
+    missing = {key for key in cache["keys"] if key in citations and key not in cache["entries"]}
+    if len(missing) > 0:
+        if blocks is None:
+            with open(fn_bib) as f:
+                blocks = split_bib_blocks(f.read())
+        bibtex = "\n".join(
+            text
+            for block_type, key, text in blocks
+            if block_type in ("string", "preamble") or key in missing
+        )
+        for key in missing:
+            cache["entries"][key] = []
+        for entry in parse_bib(bibtex):
+            cache["entries"].setdefault(entry["ID"], []).append(entry)
+        # Include entries stored meanwhile by other processes.
+        stored = load_bib_cache(fn_cache, stamp)
+        if stored is not None:
+            cache["entries"] = stored["entries"] | cache["entries"]
+        dump_bib_cache(fn_cache, cache)
+
+    entries = [
+        entry
+        for key in cache["keys"]
+        if key in citations
+        for entry in cache["entries"].get(key, [])
+    ]
+    return entries, cache["preambles"]
+
+
+def bib_cache_path(fn_bib: str) -> str:
+    """Return the path of the file with the cached entries of a BibTeX file."""
+    dn_cache = os.environ.get("XDG_CACHE_HOME", os.path.expanduser("~/.cache"))
+    digest = hashlib.sha256(os.path.abspath(fn_bib).encode()).hexdigest()
+    return os.path.join(dn_cache, "bibsane", f"{digest}.pkl")
+
+
+def load_bib_cache(fn_cache: str, stamp: tuple) -> dict | None:
+    """Load the cached entries of a BibTeX file, if possible and up to date."""
+    try:
+        with open(fn_cache, "rb") as f:
+            cache = pickle.load(f)
+    except Exception:
+        # Unpickling a corrupt or incompatible file can raise almost any exception.
+        return None
+    if not isinstance(cache, dict) or cache.get("stamp") != stamp:
+        return None
+    return cache
+
+
+def dump_bib_cache(fn_cache: str, cache: dict):
+    """Write the cached entries of a BibTeX file, or give up silently."""
+    try:
+        os.makedirs(os.path.dirname(fn_cache), exist_ok=True)
+        write_atomic(fn_cache, pickle.dumps(cache, protocol=pickle.HIGHEST_PROTOCOL))
+    except OSError:
+        pass
+
+
+def parse_bib(bibtex: str) -> list[dict[str, str]]:
+    """Parse entries from a BibTeX string.
+
+    The entries are dictionaries in the format of BibtexParser 1,
+    also when BibtexParser 2 is used to parse the string.
+    """
+    if not BIBTEXPARSER2:
+        bibtex_parser = bibtexparser.bparser.BibTexParser(
+            homogenize_fields=True,
+            ignore_nonstandard_types=False,
+        )
+        return bibtexparser.loads(bibtex, bibtex_parser).entries
+
+    # The values are interpolated below, because the middlewares of BibtexParser 2
+    # do not give the same results as BibtexParser 1.
+    library = bibtexparser.parse_string(bibtex, parse_stack=[])
+    strings = dict(BIB_MONTHS)
+    for string in library.strings:
+        strings[string.key.lower()] = interpolate_bib_value(string.value, strings, False)
+    entries = []
+    for block in library.blocks:
+        if isinstance(block, bibtexparser.model.ParsingFailedBlock):
+            # Duplicate entries and fields are kept, like in BibtexParser 1,
+            # such that they can be handled later according to the duplicate policy.
+            block = block.ignore_error_block
+        if not isinstance(block, bibtexparser.model.Entry):
+            continue
+        entry = {"ENTRYTYPE": block.entry_type.lower(), "ID": block.key}
+        for field in block.fields:
+            key = field.key.lower()
+            # The first field wins if they have the same (homogenized) name.
+            entry.setdefault(
+                FIELD_ALIASES.get(key, key), interpolate_bib_value(field.value, strings)
+            )
+        entries.append(entry)
+    return entries
+
+
+# Strings defined by default, the same as in BibtexParser 1.
+BIB_MONTHS = {
+    "jan": "January",
+    "feb": "February",
+    "mar": "March",
+    "apr": "April",
+    "may": "May",
+    "jun": "June",
+    "jul": "July",
+    "aug": "August",
+    "sep": "September",
+    "oct": "October",
+    "nov": "November",
+    "dec": "December",
+}
+
+
+def interpolate_bib_value(value: str, strings: dict[str, str], strip: bool = True) -> str:
+    """Convert a raw BibTeX value into a string, in the same way as BibtexParser 1.
+
+    The concatenated parts are joined after removing their delimiters and replacing
+    string names by their values. Unknown string names are kept as they are.
+    When strip is True, leading whitespace is removed from all but the first line
+    of braced and quoted parts.
+    """
+    parts = []
+    for part in split_bib_value(value):
+        if (part[:1] == "{" and part[-1:] == "}") or (part[:1] == '"' and part[-1:] == '"'):
+            part = part[1:-1]
+            if strip and "\n" in part:
+                lines = part.splitlines()
+                part = "\n".join([lines[0]] + [line.lstrip() for line in lines[1:]])
+            parts.append(part)
+        elif part.isdigit():
+            parts.append(part)
+        else:
+            parts.append(strings.get(part.lower(), part))
+    result = "".join(parts)
+    return "" if result == "{}" else result
+
+
+def split_bib_value(value: str) -> list[str]:
+    """Split a raw BibTeX value at the concatenation operators."""
+    if "#" not in value:
+        return [value.strip()]
+    parts = []
+    depth = 0
+    quoted = False
+    begin = 0
+    for index, char in enumerate(value):
+        if char == "{":
+            depth += 1
+        elif char == "}":
+            depth -= 1
+        elif char == '"' and depth == 0:
+            quoted = not quoted
+        elif char == "#" and depth == 0 and not quoted:
+            parts.append(value[begin:index].strip())
+            begin = index + 1
+    parts.append(value[begin:].strip())
+    return parts
 
 
 def drop_check_citations(
-    entries: list[dict[str, str]], citations: Collection[str], drop
+    entries: list[dict[str, str]], citations: Collection[str], defined: Collection[str], drop
 ) -> tuple[list[dict[str, str]], bool]:
-    """Drop unused citations and complain about missing ones."""
+    """Drop unused citations and complain about missing ones.
+
+    The defined BibTeX IDs are passed in, because they are known when collecting entries.
+    """
     # Check for undefined references
-    defined = {entry["ID"] for entry in entries}
     valid = True
     for citation in citations:
         if citation not in defined:
@@ -347,6 +704,14 @@ def clean_entries(
     entries: list[dict[str, str]], citation_policies: dict[str, dict[str, FieldPolicy]]
 ) -> tuple[list[dict[str, str]], bool]:
     """Clean the irrelevant fields in each entry and complain about missing ones."""
+    # Split the policies once into tuples of required and optional fields.
+    field_policies = {
+        etype: (
+            tuple(field for field, policy in entry_policy.items() if policy == FieldPolicy.MUST),
+            tuple(field for field, policy in entry_policy.items() if policy == FieldPolicy.MAY),
+        )
+        for etype, entry_policy in citation_policies.items()
+    }
     cleaned = []
     valid = True
     for old_entry in entries:
@@ -356,50 +721,54 @@ def clean_entries(
         if "bibsane" in old_entry:
             etype = old_entry.pop("bibsane")
             new_entry["bibsane"] = etype
-        entry_policy = citation_policies.get(etype)
+        entry_policy = field_policies.get(etype)
         if entry_policy is None:
             print(f"   🤔 {eid}: @{etype} is not configured")
             valid = False
             continue
         cleaned.append(new_entry)
-        for field, policy in entry_policy.items():
-            if policy == FieldPolicy.MUST:
-                if field not in old_entry:
-                    print(f"   🫥 {eid}: @{etype} missing field {field}")
-                    valid = False
-                else:
-                    new_entry[field] = old_entry.pop(field)
+        must_fields, may_fields = entry_policy
+        for field in must_fields:
+            value = old_entry.pop(field, None)
+            if value is None:
+                print(f"   🫥 {eid}: @{etype} missing field {field}")
+                valid = False
             else:
-                assert policy == FieldPolicy.MAY
-                if field in old_entry:
-                    new_entry[field] = old_entry.pop(field)
+                new_entry[field] = value
+        for field in may_fields:
+            value = old_entry.pop(field, None)
+            if value is not None:
+                new_entry[field] = value
         if len(old_entry) > 0:
             for field in old_entry:
                 print(f"   💨 {eid}: @{etype} discarding field {field}")
     return cleaned, valid
 
 
+# Fields in which braces are allowed.
+BRACE_FIELDS = frozenset(["author", "editor", "note", "title"])
+
+
 def fix_bad_practices(entries: list[dict[str, str]]) -> list[dict[str, str]]:
-    """Fix unwarranted use of braces."""
-    result = []
-    for old_record in entries:
-        # Strip all braces
-        new_record = {
-            key: value.replace("{", "").replace("}", "") for (key, value) in old_record.items()
-        }
-        # Except from the author, editor, note or title
-        for field in "author", "editor", "note", "title":
-            if field in old_record:
-                new_record[field] = old_record[field]
-        result.append(new_record)
-    return result
+    """Fix unwarranted use of braces. (in place)"""
+    for entry in entries:
+        for key, value in entry.items():
+            # Most values have no braces, so they are only stripped when needed.
+            if key not in BRACE_FIELDS and ("{" in value or "}" in value):
+                entry[key] = value.replace("{", "").replace("}", "")
+    return entries
 
 
 def potential_mistakes(entries: list[dict[str, str]]) -> bool:
     """Detect potential mistakes in the BibTeX entry keys."""
+    # Fast path for the common case without any keys that differ only by case.
+    folded_ids = [entry["ID"].casefold() for entry in entries]
+    if len(set(folded_ids)) == len(folded_ids):
+        return False
+
     id_case_map = {}
-    for entry in entries:
-        id_case_map.setdefault(entry["ID"].lower(), []).append(entry["ID"])
+    for folded_id, entry in zip(folded_ids, entries, strict=True):
+        id_case_map.setdefault(folded_id, []).append(entry["ID"])
 
     mistakes = False
     for groups in id_case_map.values():
@@ -416,31 +785,40 @@ DOI_PROXIES = [
     "https://dx.doi.org/",
     "doi:",
 ]
+# Longer proxies are tried first, in case one proxy is a prefix of another.
+DOI_PROXY_PATTERN = re.compile(
+    "^(?:"
+    + "|".join(re.escape(proxy) for proxy in sorted(DOI_PROXIES, key=len, reverse=True))
+    + ")"
+)
 
 
 def normalize_doi(entries: list[dict[str, str]]) -> tuple[list[dict[str, str]], bool]:
-    """Normalize the DOIs in the entries."""
-    result = []
+    """Normalize the DOIs in the entries. (in place)"""
     valid = True
     for entry in entries:
         doi = entry.get("doi")
         if doi is not None:
-            doi = doi.lower()
-            for proxy in DOI_PROXIES:
-                if doi.startswith(proxy):
-                    doi = doi[len(proxy) :]
-                    break
+            doi = DOI_PROXY_PATTERN.sub("", doi.lower(), count=1)
             if doi.count("/") == 0 or not doi.startswith("10."):
                 print("   🤕 invalid DOI:", doi)
                 valid = False
-            entry = entry | {"doi": doi}
-        result.append(entry)
-    return result, valid
+            entry["doi"] = doi
+    return entries, valid
+
+
+# Whitespace that is not a single space: it is replaced by a single space.
+# Single spaces are not matched, which avoids needless substitutions.
+WHITESPACE_PATTERN = re.compile(r"\s\s+|[^\S ]")
 
 
 def normalize_whitespace(entries: list[dict[str, str]]) -> list[dict[str, str]]:
-    """Normalize the whitespace inside the field values."""
-    return [{key: re.sub(r"\s+", " ", value) for key, value in entry.items()} for entry in entries]
+    """Normalize the whitespace inside the field values. (in place)"""
+    sub = WHITESPACE_PATTERN.sub
+    for entry in entries:
+        for key, value in entry.items():
+            entry[key] = sub(" ", value)
+    return entries
 
 
 def normalize_names(entries: list[dict[str, str]]) -> list[dict[str, str]]:
@@ -462,58 +840,95 @@ def normalize_names(entries: list[dict[str, str]]) -> list[dict[str, str]]:
     return result
 
 
+# Hyphen, non-breaking hyphen, en dash, em dash, hyphen-minus, minus sign
+PAGE_SEPARATORS = ["\u2010", "\u2011", "\u2013", "\u2014", "-", "\u2212"]
+
+
 def fix_page_double_hyphen(entries: list[dict[str, str]]) -> list[dict[str, str]]:
-    """Fix page ranges for which no double hyphen is used."""
-    result = []
+    """Fix page ranges for which no double hyphen is used. (in place)"""
     for entry in entries:
-        # Warning: bibtexparser modifies entries in place.
-        # It does not hurt in this case, but it can otherwise give unexpected results.
-        entry = bibtexparser.customization.page_double_hyphen(entry)
-        result.append(entry)
-    return result
+        pages = entry.get("pages")
+        if pages is not None:
+            for separator in PAGE_SEPARATORS:
+                if separator in pages:
+                    parts = [part.strip().strip(separator) for part in pages.split(separator)]
+                    pages = parts[0] + "--" + parts[-1]
+            entry["pages"] = pages
+    return entries
 
 
-def abbreviate_journal_iso(entries: list[dict[str, str]], fn_cache: str) -> list[dict[str, str]]:
-    """Replace journal names by their ISO abbreviation."""
+def abbreviate_journal_iso(
+    entries: list[dict[str, str]], fn_cache: str, max_workers: int = DOWNLOAD_MAX_WORKERS
+) -> list[dict[str, str]]:
+    """Replace journal names by their ISO abbreviation. (in place)"""
 
     # Initialize cache
     if fn_cache is None or not os.path.isfile(fn_cache):
         cache = {}
     else:
-        with open(fn_cache) as f:
-            cache = json.load(f)
+        cache = load_json(fn_cache)
+
+    # Download missing abbreviations concurrently
+    missing = sorted(
+        {
+            entry["journal"]
+            for entry in entries
+            if "." not in entry.get("journal", ".") and entry["journal"] not in cache
+        }
+    )
+    if len(missing) > 0:
+        for journal in missing:
+            print("   Downloading abbreviation for:", journal)
+        with concurrent.futures.ThreadPoolExecutor(max_workers) as executor:
+            cache.update(zip(missing, executor.map(download_abbrev, missing), strict=True))
 
     # Abbreviate journals
-    result = []
     for entry in entries:
         journal = entry.get("journal")
         if journal is not None and "." not in journal:
-            abbrev = cache.get(journal)
-            if abbrev is None:
-                abbrev = download_abbrev(journal)
-                cache[journal] = abbrev
-            entry = entry | {"journal": abbrev}
-        result.append(entry)
+            entry["journal"] = cache[journal]
+
+    # Store cache, only if it has changed.
+    if fn_cache is not None and len(missing) > 0:
+        # Include abbreviations stored meanwhile by other processes.
+        if os.path.isfile(fn_cache):
+            cache = load_json(fn_cache) | cache
+        write_atomic(fn_cache, (json.dumps(cache, indent=2) + "\n").encode())
+    return entries
 
-    # Store cache
-    if fn_cache is not None:
-        with open(fn_cache, "w") as f:
-            json.dump(cache, f, indent=2)
-            f.write("\n")
-    return result
+
+def load_json(path: str):
+    """Load a JSON file, with orjson if it is installed."""
+    with open(path, "rb") as f:
+        data = f.read()
+    return json.loads(data) if orjson is None else orjson.loads(data)
 
 
 def download_abbrev(journal: str) -> str:
-    """Download the abbreviation of a full journal name."""
-    print("   Downloading abbreviation for:", journal)
+    """Download the abbreviation of a full journal name.
+
+    Only timeouts, connection problems and server errors are retried.
+    """
     journal_quote = urllib.parse.quote(journal)
     prefix = "https://abbreviso.toolforge.org/abbreviso/a/"
-    with urllib.request.urlopen(prefix + journal_quote) as f:
-        return f.read().decode()
+    for attempt in range(DOWNLOAD_ATTEMPTS):
+        try:
+            with urllib.request.urlopen(prefix + journal_quote, timeout=DOWNLOAD_TIMEOUT) as f:
+                return f.read().decode()
+        except urllib.error.HTTPError as exc:
+            if exc.code < 500 or attempt == DOWNLOAD_ATTEMPTS - 1:
+                raise
+        except (urllib.error.URLError, TimeoutError, ConnectionError):
+            if attempt == DOWNLOAD_ATTEMPTS - 1:
+                raise
+        time.sleep(DOWNLOAD_BACKOFF * 2**attempt)
 
 
 def merge_entries(entries: list[dict[str, str]], field: str) -> tuple[list[dict[str, str]], bool]:
-    """Merge entries who have the same value for the given field. (case-insensitive)"""
+    """Merge entries who have the same value for the given field. (case-insensitive)
+
+    The merged entry keeps the spelling of the given field of the first entry.
+    """
     lookup = {}
     missing_key = []
     merge_conflict = False
@@ -523,12 +938,12 @@ def merge_entries(entries: list[dict[str, str]], field: str) -> tuple[list[dict[
             print(f"   👽 Cannot merge entry without {field}:", entry["ID"])
             missing_key.append(entry)
         else:
-            other = lookup.setdefault(identifier, {})
+            other = lookup.setdefault(identifier.casefold(), {})
             for key, value in entry.items():
                 if key not in other:
                     other[key] = value
-                elif other[key] != value:
-                    print(f"   😭 Same {field}={identifier}, different {key}:", value, other[key])
+                elif key != field and other[key] != value:
+                    print(f"   😭 Same {field}={other[field]}, different {key}:", value, other[key])
                     merge_conflict = True
     return list(lookup.values()) + missing_key, merge_conflict
 
@@ -537,47 +952,141 @@ def sort_entries(entries: list[dict[str, str]]) -> list[dict[str, str]]:
     """Sort the entries in convenient way: by year, then by author."""
 
     def keyfn(entry):
-        # Make a fake entry to avoid in-place modification.
-        entry = {"author": entry.get("author", "Aaaa Aaaa"), "year": entry.get("year", "0000")}
-        first_author = bibtexparser.customization.author(entry)["author"][0].lower()
-        key = entry["year"] + first_author
-        return key
+        return entry.get("year", "0000") + first_author_key(entry.get("author", "Aaaa Aaaa"))
 
     return sorted(entries, key=keyfn)
 
 
+# Separator of names in the author field, as in BibtexParser 1.
+AUTHOR_SEPARATOR_PATTERN = re.compile(" and ", re.IGNORECASE)
+
+# Words that are moved from the first names to the last name, as in BibtexParser 1.
+NAME_PARTICLES = frozenset(["ben", "van", "der", "de", "la", "le"])
+
+
+def first_author_key(authors: str) -> str:
+    """Return the first author in the format "last, first" in lowercase, for sorting.
+
+    Names are split in the same (simple) way as in BibtexParser 1,
+    such that the order does not depend on the installed version of BibtexParser.
+    """
+    for name in AUTHOR_SEPARATOR_PATTERN.split(authors.replace("\n", " ")):
+        name = name.strip()
+        if len(name) > 0:
+            return format_last_first(name).lower()
+    return ""
+
+
+def format_last_first(name: str) -> str:
+    """Format a single name as "last, first"."""
+    if "," in name:
+        last, first = name.split(",", 1)
+        last = last.strip()
+        firsts = first.split()
+    else:
+        if "{" in name and "}" in name:
+            # Split at spaces outside braces.
+            words = []
+            depth = 0
+            begin = 0
+            for index, char in enumerate(name):
+                if char == "{":
+                    depth += 1
+                elif char == "}":
+                    depth -= 1
+                    if depth < 0:
+                        return name
+                elif char == " " and depth == 0:
+                    words.append(name[begin:index])
+                    begin = index + 1
+            if depth != 0:
+                return name
+            words.append(name[begin:])
+        else:
+            words = name.split()
+        last = words.pop()
+        firsts = [word.replace(".", ". ").strip() for word in words]
+    if last in ["jnr", "jr", "junior"] and len(firsts) > 0:
+        last = firsts.pop()
+    # The particles are taken from the end of the first names, one for each particle found.
+    for word in firsts:
+        if word in NAME_PARTICLES:
+            last = firsts.pop() + " " + last
+    return last + ", " + " ".join(firsts)
+
+
 def write_output(entries: list[dict[str, str]], fn_out: str, retcode: int, verbose: bool) -> int:
     """Write out the fixed bibtex file, in case it has changed."""
     if retcode == RETURN_CODE_CHANGED:
         # Write out a single BibTeX database.
-        db_out = bibtexparser.bibdatabase.BibDatabase()
-        db_out.entries = entries
-        writer = bibtexparser.bwriter.BibTexWriter()
-        writer.order_entries_by = None
-        with tempfile.TemporaryDirectory("bibsane") as dn_tmp:
-            fn_tmp = os.path.join(dn_tmp, "tmp.bib")
-            with open(fn_tmp, "w") as f:
-                bibtexparser.dump(db_out, f, writer)
-            if os.path.isfile(fn_out):
-                old_hash = checksum(fn_out)
-                new_hash = checksum(fn_tmp)
-                if old_hash == new_hash:
+        data = format_bib(entries).encode()
+        # The old file is only read when the size is the same.
+        if os.path.isfile(fn_out) and os.path.getsize(fn_out) == len(data):
+            with open(fn_out, "rb") as f:
+                if f.read() == data:
                     retcode = RETURN_CODE_UNCHANGED
-            if retcode == RETURN_CODE_CHANGED:
-                print("💾 Please check the new or corrected file:", fn_out)
-                shutil.copy(fn_tmp, fn_out)
-            elif verbose:
-                print("😀 No changes to", fn_out)
+        if retcode == RETURN_CODE_CHANGED:
+            print("💾 Please check the new or corrected file:", fn_out)
+            write_atomic(fn_out, data)
+        elif verbose:
+            print("😀 No changes to", fn_out)
     else:
         print(f"💥 Broken bibliography. Not writing: {fn_out}")
 
     return retcode
 
 
-def checksum(path: str) -> bytes:
-    """Compute the SHA256 checksum from the contents of a file."""
-    with open(path, "rb") as f:
-        return hashlib.sha256(f.read()).digest()
+def format_bib(entries: list[dict[str, str]]) -> str:
+    """Format entries as a BibTeX string, with the fields in alphabetical order.
+
+    The format is the same as that of the BibTexWriter of BibtexParser 1,
+    but the string is built directly, which is a lot faster.
+    This also works with BibtexParser 2, whose Library does not accept duplicate keys,
+    which may be present here, depending on the duplicate policy.
+    """
+    pieces = []
+    for entry in entries:
+        if len(pieces) > 0:
+            pieces.append("\n")
+        pieces.append(f"@{entry['ENTRYTYPE']}{{{entry['ID']}")
+        for field, value in sorted(entry.items()):
+            if field not in ("ENTRYTYPE", "ID"):
+                pieces.append(f",\n {field} = {{{value}}}")
+        pieces.append("\n}\n")
+    return "".join(pieces)
+
+
+def write_atomic(path: str, data: bytes):
+    """Write a file atomically, such that it is never left incomplete.
+
+    The data is first written to a temporary file in the same directory,
+    which is then renamed. The permissions of an existing file are preserved.
+    Symbolic links are followed, and a file with hard links is overwritten in place,
+    such that the links are not broken.
+    """
+    path = os.path.realpath(path)
+    if os.path.isfile(path):
+        stat = os.stat(path)
+        if stat.st_nlink > 1:
+            with open(path, "wb") as f:
+                f.write(data)
+            return
+        mode = stat.st_mode & 0o777
+    else:
+        umask = os.umask(0)
+        os.umask(umask)
+        mode = 0o666 & ~umask
+    f = tempfile.NamedTemporaryFile(
+        "wb", dir=os.path.dirname(path), prefix=".bibsane", delete=False
+    )
+    try:
+        with f:
+            f.write(data)
+        os.chmod(f.name, mode)
+        os.replace(f.name, path)
+    except BaseException:
+        os.remove(f.name)
+        raise
 
 
 if __name__ == "__main__":